@@ -1,14 +1,14 @@
 import asyncio
+import codecs
+import hashlib
 import os
 import pty
 import re
-import select
 import signal
 import subprocess
 import threading
 import time
 from collections import deque
-from datetime import datetime
 
 import psutil
 from dotenv import load_dotenv
@@ -21,15 +21,61 @@ from telegram.ext import (
     filters,
 )
 
+# Box-drawing characters that make up Cline's UI frame
+_BOX_CHARSET = frozenset("│┃╭╰╮╯")
+# Frame characters and footer hint that mark Cline's redrawn input box in forwarded output
+UI_INDICATOR_CHARS = frozenset("╭╰│┃")
+MODE_HINT = "/plan or /act"
+# 7-bit ESC sequences plus the single-character 8-bit CSI form (U+009B)
+_ANSI_RE = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])|\x9B[0-?]*[ -/]*[@-~]")
+
+# Interactive prompts Cline may wait on, matched at the end of an output chunk
+PROMPT_PATTERNS = (
+    r"\[y/N\]\s*$",
+    r"\[Y/n\]\s*$",
+    r"\(y/n\)\s*$",
+    r"\(Y/N\)\s*$",
+    r"Continue\?\s*$",
+    r"Proceed\?\s*$",
+    r"Are you sure\?\s*$",
+    r"Enter .*:\s*$",
+    r"Password:\s*$",
+    r"Press.*Enter.*to.*continue\s*$",
+    r"Press.*any.*key\s*$",
+    r"\[.*\]\s*$",
+    r"Press .*to exit\s*$",
+    r"Press .* to return\s*$",
+)
+# One capturing group per pattern so match.lastindex identifies which one fired
+_PROMPT_RE = re.compile("|".join(f"({pattern})" for pattern in PROMPT_PATTERNS), re.IGNORECASE)
+# Same alternation plus a trailing group for any bracketed suffix, so ordinary chunks need one scan
+_INPUT_REQUEST_RE = re.compile(_PROMPT_RE.pattern + r"|([\[\(].*[\]\)]\s*$)", re.IGNORECASE)
+
 
 def strip_ansi_codes(text):
     """Remove ANSI escape sequences from text"""
-    return re.sub(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])", "", text)
+    if "\x1b" not in text and "\x9b" not in text:
+        return text
+    return _ANSI_RE.sub("", text)
+
+
+def split_message(text, limit):
+    """Yield pieces of text of at most limit characters, breaking after a newline where possible"""
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit) + 1 or limit
+        yield text[:cut]
+        text = text[cut:]
+    if text:
+        yield text
 
 
 def debug_log(level, message, **kwargs):
     """Centralized debug logging"""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    # Check the level before any formatting so disabled calls cost one dict lookup
+    if not _LEVEL_ENABLED.get(level, True):
+        return
+    now = time.time()
+    timestamp = f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now))}.{int(now % 1 * 1000):03d}"
     context = " | ".join(f"{k}={v}" for k, v in kwargs.items()) if kwargs else ""
     suffix = f" | {context}" if context else ""
     print(f"[{timestamp}] [{level}] {message}{suffix}")
@@ -40,10 +86,67 @@ TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 AUTHORIZED_USER_ID = int(os.getenv("AUTHORIZED_USER_ID", "0"))
 CLINE_COMMAND = ["cline"]
 
+PTY_READ_SIZE = 65536  # Large enough to drain a full PTY buffer in one read
+OUTPUT_COALESCE_WINDOW = 0.25  # Seconds to let a burst of output gather before sending it
+OUTPUT_COALESCE_CHARS = 3500  # Send early once this much output is queued
+MAX_MESSAGE_LENGTH = 4000  # Stays under Telegram's 4096-character message limit
+OUTPUT_QUEUE_MAXLEN = 100  # Oldest chunks are dropped beyond this
+
 DEBUG_INFO, DEBUG_WARN, DEBUG_ERROR, DEBUG_DEBUG = "INFO", "WARN", "ERROR", "DEBUG"
+# DEBUG-level messages are only printed when the DEBUG environment variable is set
+_LEVEL_ENABLED = {
+    DEBUG_INFO: True,
+    DEBUG_WARN: True,
+    DEBUG_ERROR: True,
+    DEBUG_DEBUG: bool(os.getenv("DEBUG")),
+}
+
+# Reply texts for /status keyed by (session_active, waiting_for_input, output_reader_healthy)
+STATUS_MESSAGES = {
+    (active, waiting, healthy): "Status: {}{}\nReader: {}".format(
+        "🟢 Running" if active else "🔴 Stopped",
+        " (waiting for input)" if waiting else "",
+        "✓" if healthy else "✗",
+    )
+    for active in (True, False)
+    for waiting in (True, False)
+    for healthy in (True, False)
+}
+MODE_SWITCH_MESSAGES = {
+    "/plan": "📋 Switched to **PLAN MODE**",
+    "/act": "📋 Switched to **ACT MODE**",
+}
 
 
 class ClineTelegramBot:
+    # Fixed attribute layout: cheaper attribute access on the output hot path
+    __slots__ = (
+        "state_lock",
+        "output_queue_lock",
+        "command_lock",
+        "master_fd",
+        "slave_fd",
+        "process",
+        "is_running",
+        "output_queue",
+        "output_loop",
+        "output_decoder",
+        "output_ready",
+        "current_command",
+        "waiting_for_input",
+        "input_prompt",
+        "last_prompt_time",
+        "session_active",
+        "session_lock",
+        "child_pids",
+        "application",
+        "last_chat_id",
+        "command_handlers",
+        "_output_monitor_started",
+        "output_reader_healthy",
+        "last_reader_heartbeat",
+    )
+
     def __init__(self):
         debug_log(DEBUG_INFO, "ClineTelegramBot.__init__ called")
 
@@ -56,18 +159,29 @@ class ClineTelegramBot:
         self.slave_fd = None
         self.process = None
         self.is_running = False
-        self.output_queue = deque()
-        self.output_thread = None
-        self.stop_reading = False
+        self.output_queue = deque(maxlen=OUTPUT_QUEUE_MAXLEN)
+        self.output_loop = None  # Event loop watching master_fd for output
+        self.output_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.output_ready = None  # asyncio.Event set whenever output is queued
         self.current_command = None
         self.waiting_for_input = False
         self.input_prompt = ""
         self.last_prompt_time = 0
         self.session_active = False
+        self.session_lock = None  # asyncio.Lock serializing start/stop, created on first use
         self.child_pids = set()
         self.application = None
         self.last_chat_id = None
         self._output_monitor_started = False
+        # Built once rather than on every dispatched command
+        self.command_handlers = {
+            "/start": self._start,
+            "/stop": self._stop,
+            "/status": self._status,
+            "/cancel": self._cancel,
+            "/plan": self._mode_switch,
+            "/act": self._mode_switch,
+        }
 
         # Health monitoring
         self.output_reader_healthy = False
@@ -81,58 +195,85 @@ class ClineTelegramBot:
             for child in parent.children(recursive=True):
                 children.add(child.pid)
             children.add(parent_pid)
-        except psutil.NoSuchProcess:
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
             pass
         return children
 
     def _kill_process_tree(self, pid):
         """Kill a process and all its children"""
+        self._kill_process_trees((pid,))
+
+    def _kill_process_trees(self, pids):
+        """Kill several processes and all their children, waiting on them together"""
         try:
-            children = self._find_child_processes(pid)
+            children = set()
+            for pid in pids:
+                children |= self._find_child_processes(pid)
             debug_log(
                 DEBUG_DEBUG,
                 "Killing process tree",
-                parent_pid=pid,
+                parent_pids=list(pids),
                 children_count=len(children),
             )
 
+            procs = []
             for child_pid in children:
                 try:
-                    psutil.Process(child_pid).terminate()
+                    proc = psutil.Process(child_pid)
+                    proc.terminate()
+                    procs.append(proc)
                 except psutil.NoSuchProcess:
                     continue
+                except psutil.AccessDenied:
+                    # Another user's process can match "cline"; skip it rather than abandon the rest
+                    debug_log(DEBUG_WARN, "Access denied terminating process", pid=child_pid)
+                    continue
 
-            time.sleep(0.5)
-
-            for child_pid in children:
+            # Returns as soon as every process has exited rather than always sleeping the full grace period
+            _, alive = psutil.wait_procs(procs, timeout=0.5)
+            for proc in alive:
                 try:
-                    p = psutil.Process(child_pid)
-                    if p.is_running():
-                        p.kill()
-                except psutil.NoSuchProcess:
+                    proc.kill()
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
                     pass
-
-            time.sleep(0.2)
-            debug_log(DEBUG_DEBUG, "Process tree killed", parent_pid=pid)
+            psutil.wait_procs(alive, timeout=0.2)
+            debug_log(DEBUG_DEBUG, "Process tree killed", parent_pids=list(pids))
         except Exception as e:
-            debug_log(DEBUG_ERROR, "Error killing process tree", pid=pid, error=str(e))
+            debug_log(DEBUG_ERROR, "Error killing process tree", pids=list(pids), error=str(e))
 
-    def _ensure_session_clean(self):
-        """Ensure no existing Cline processes are running"""
+    def _find_cline_processes(self):
+        """Find PIDs of running Cline processes"""
         cline_processes = []
-        for proc in psutil.process_iter(["pid", "name", "cmdline"]):
+        if not os.path.isdir("/proc"):
+            for proc in psutil.process_iter(["pid", "cmdline"]):
+                try:
+                    cmdline = " ".join(proc.info["cmdline"] or [])
+                    if "cline" in cmdline and "python" not in cmdline:
+                        cline_processes.append(proc.info["pid"])
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+            return cline_processes
+
+        # Read cmdline straight from /proc: one small read per process instead of psutil's stat+cmdline
+        for entry in os.scandir("/proc"):
+            if not entry.name.isdigit():
+                continue
             try:
-                cmdline = " ".join(proc.info["cmdline"] or [])
-                if "cline" in cmdline and "python" not in cmdline:
-                    cline_processes.append(proc.info["pid"])
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                with open(f"{entry.path}/cmdline", "rb") as f:
+                    cmdline = f.read()
+            except OSError:
                 continue
+            if b"cline" in cmdline and b"python" not in cmdline:
+                cline_processes.append(int(entry.name))
+        return cline_processes
 
+    def _ensure_session_clean(self):
+        """Ensure no existing Cline processes are running"""
+        cline_processes = self._find_cline_processes()
         if cline_processes:
             debug_log(DEBUG_WARN, "Found existing Cline processes", count=len(cline_processes))
-            for pid in cline_processes:
-                self._kill_process_tree(pid)
-            time.sleep(1)
+            # One shared grace period for every stray tree; wait_procs already confirms they exited
+            self._kill_process_trees(cline_processes)
 
     def _close_fd(self, fd, fd_name):
         """Close a file descriptor safely"""
@@ -145,10 +286,55 @@ class ClineTelegramBot:
             return None
         return None
 
+    def _start_output_reader(self):
+        """Watch master_fd from the running event loop"""
+        self.output_loop = asyncio.get_running_loop()
+        if self.output_ready is None:
+            self.output_ready = asyncio.Event()
+        os.set_blocking(self.master_fd, False)
+        self.output_loop.add_reader(self.master_fd, self._on_pty_readable)
+        self.output_reader_healthy = True
+        self.last_reader_heartbeat = time.time()
+        debug_log(DEBUG_INFO, "Output reader registered with event loop")
+
+    def _stop_output_reader(self):
+        """Stop watching master_fd from the event loop"""
+        if self.output_loop is None:
+            return
+        try:
+            self.output_loop.remove_reader(self.master_fd)
+        except Exception as e:
+            debug_log(DEBUG_ERROR, "Error removing output reader", error=str(e))
+        self.output_loop = None
+        self.output_reader_healthy = False
+
+    def _on_pty_readable(self):
+        """Event loop callback: read everything the PTY has buffered and process it"""
+        self.last_reader_heartbeat = time.time()
+        try:
+            data = os.read(self.master_fd, PTY_READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            # EIO once the Cline process has gone away
+            debug_log(DEBUG_WARN, "PTY read failed, stopping output reader", error=str(e))
+            self._stop_output_reader()
+            return
+
+        if not data:
+            debug_log(DEBUG_WARN, "EOF received from PTY")
+            self._stop_output_reader()
+            return
+
+        # Incremental decoder keeps multi-byte characters split across reads intact
+        output = self.output_decoder.decode(data)
+        if output:
+            self._process_output(output)
+
     def _cleanup_resources(self):
         """Comprehensive cleanup of all resources"""
         debug_log(DEBUG_INFO, "Performing comprehensive cleanup")
-        self.stop_reading = True
+        self._stop_output_reader()
 
         if self.process:
             self._kill_process_tree(self.process.pid)
@@ -166,92 +352,97 @@ class ClineTelegramBot:
 
         debug_log(DEBUG_DEBUG, "Cleanup complete")
 
-    def start_pty_session(self, application=None):
+    def _get_session_lock(self):
+        """Return the lock that makes overlapping /start and /stop wait their turn"""
+        # Created lazily so it binds to the loop that runs the bot (Python 3.9 binds at construction)
+        if self.session_lock is None:
+            self.session_lock = asyncio.Lock()
+        return self.session_lock
+
+    async def start_pty_session(self, application=None):
         """Start PTY session with proper process management"""
         debug_log(DEBUG_INFO, "start_pty_session called")
 
-        with self.state_lock:
-            if self.session_active:
-                debug_log(DEBUG_WARN, "Session already active")
-                return False
-
-            self._ensure_session_clean()
+        async with self._get_session_lock():
+            with self.state_lock:
+                if self.session_active:
+                    debug_log(DEBUG_WARN, "Session already active")
+                    return False
+            return await self._start_pty_session(application)
 
-            try:
-                self.master_fd, self.slave_fd = pty.openpty()
-                env = dict(os.environ, TERM="xterm-256color", COLUMNS="80", LINES="24")
-
-                self.process = subprocess.Popen(
-                    CLINE_COMMAND,
-                    stdin=self.slave_fd,
-                    stdout=self.slave_fd,
-                    stderr=self.slave_fd,
-                    preexec_fn=os.setsid,
-                    env=env,
-                )
+    async def _start_pty_session(self, application):
+        """Bring up the PTY and Cline; caller holds session_lock"""
+        try:
+            # Killing stray processes sleeps between signals; keep it off the event loop
+            await asyncio.to_thread(self._ensure_session_clean)
+
+            self.master_fd, self.slave_fd = pty.openpty()
+            env = dict(os.environ, TERM="xterm-256color", COLUMNS="80", LINES="24")
+
+            self.process = subprocess.Popen(
+                CLINE_COMMAND,
+                stdin=self.slave_fd,
+                stdout=self.slave_fd,
+                stderr=self.slave_fd,
+                start_new_session=True,
+                env=env,
+            )
 
-                self.child_pids = {self.process.pid}
-                time.sleep(0.5)
+            self.child_pids = {self.process.pid}
+            await asyncio.sleep(0.5)
 
-                if self.process.poll() is not None:
-                    raise RuntimeError("Cline process died immediately")
+            if self.process.poll() is not None:
+                raise RuntimeError("Cline process died immediately")
 
+            with self.state_lock:
                 self.is_running = True
                 self.session_active = True
-                self.stop_reading = False
-                self.output_reader_healthy = False
-                self.output_thread = threading.Thread(target=self._output_reader, daemon=True)
-                self.output_thread.start()
-
-                debug_log(DEBUG_INFO, "PTY session started successfully")
-                time.sleep(1)
-
-                if application:
-
-                    async def notify():
-                        await self._send_notification(
-                            AUTHORIZED_USER_ID,
-                            "🟢 **Cline Session Started**\n\nPTY session is now active and ready for commands.",
-                            "Session start notification sent",
-                            "Failed to send session start notification",
-                        )
+            self.output_decoder.reset()
+            self._start_output_reader()
 
-                    try:
-                        loop = asyncio.get_event_loop()
-                        loop.create_task(notify())
-                    except Exception as e:
-                        debug_log(DEBUG_ERROR, "Failed to schedule notification", error=str(e))
+            debug_log(DEBUG_INFO, "PTY session started successfully")
+            await asyncio.sleep(1)
 
-                return True
-            except Exception as e:
-                debug_log(DEBUG_ERROR, "Failed to start PTY session", error=str(e))
-                self._cleanup_resources()
-                return False
-
-    def stop_pty_session(self, application=None):
-        """Stop PTY session with comprehensive cleanup"""
-        debug_log(DEBUG_INFO, "stop_pty_session called")
-
-        with self.state_lock:
-            if not self.session_active:
-                return
+            if application:
 
-            self.stop_reading = True
-            self.session_active = False
+                async def notify():
+                    await self._send_notification(
+                        AUTHORIZED_USER_ID,
+                        "🟢 **Cline Session Started**\n\nPTY session is now active and ready for commands.",
+                        "Session start notification sent",
+                        "Failed to send session start notification",
+                    )
 
-            if self.process:
-                self._kill_process_tree(self.process.pid)
-                self._ensure_session_clean()
+                try:
+                    loop = asyncio.get_event_loop()
+                    loop.create_task(notify())
+                except Exception as e:
+                    debug_log(DEBUG_ERROR, "Failed to schedule notification", error=str(e))
 
-            # Wait for reader thread to notice stop_reading flag
-            time.sleep(0.3)
+            return True
+        except Exception as e:
+            debug_log(DEBUG_ERROR, "Failed to start PTY session", error=str(e))
+            self._stop_output_reader()
+            with self.state_lock:
+                self.is_running = False
+            await asyncio.to_thread(self._cleanup_resources)
+            return False
 
-            if self.output_thread and self.output_thread.is_alive():
-                self.output_thread.join(timeout=2.0)
-                if self.output_thread.is_alive():
-                    debug_log(DEBUG_WARN, "Output thread did not exit cleanly")
+    async def stop_pty_session(self, application=None):
+        """Stop PTY session with comprehensive cleanup"""
+        debug_log(DEBUG_INFO, "stop_pty_session called")
 
-            self._cleanup_resources()
+        async with self._get_session_lock():
+            with self.state_lock:
+                if not self.session_active:
+                    return
+                self.session_active = False
+                # Cleared on the loop so no handler writes to master_fd while the worker closes it
+                self.is_running = False
+
+            self._stop_output_reader()
+            # Process-tree teardown sleeps between terminate and kill; keep it off the event loop
+            await asyncio.to_thread(self._cleanup_resources)
             self._output_monitor_started = False
 
         if application:
@@ -285,163 +476,126 @@ class ClineTelegramBot:
         except Exception as e:
             debug_log(DEBUG_ERROR, "Failed to send message", error=str(e))
 
-    def _output_reader(self):
-        """Background thread to continuously read PTY output"""
-        debug_log(DEBUG_INFO, "Output reader thread started")
-        read_count = 0
-        error_count = 0
-
-        self.output_reader_healthy = True
-        self.last_reader_heartbeat = time.time()
-
-        while not self.stop_reading and self.is_running:
-            try:
-                self.last_reader_heartbeat = time.time()
-
-                ready, _, _ = select.select([self.master_fd], [], [], 0.1)
-                if ready:
-                    data = os.read(self.master_fd, 4096)
-                    if data:
-                        output = data.decode("utf-8", errors="replace")
-                        read_count += 1
-                        self._process_output(output)
-                        error_count = 0  # Reset error count on success
-                    else:
-                        debug_log(DEBUG_WARN, "EOF received from PTY")
-                        break
-                else:
-                    time.sleep(0.05)
-            except OSError as e:
-                error_count += 1
-                if error_count > 10:
-                    debug_log(
-                        DEBUG_ERROR,
-                        "Too many read errors, stopping output reader",
-                        error=str(e),
-                    )
-                    break
-                time.sleep(0.1)
-            except Exception as e:
-                error_count += 1
-                debug_log(DEBUG_ERROR, "Unexpected error in output reader", error=str(e))
-                if error_count > 10:
-                    break
-                time.sleep(0.1)
-
-        self.output_reader_healthy = False
-        debug_log(
-            DEBUG_INFO,
-            "Output reader thread stopped",
-            total_reads=read_count,
-            total_errors=error_count,
-        )
-
     def _process_output(self, output):
         """Process incoming output from Cline"""
         clean_output = strip_ansi_codes(output)
+        if not clean_output:
+            return
 
-        is_welcome_screen = "cline cli" in clean_output
-        is_box_line = bool(re.match(r"^[\s│┃╭╰╮╯]+$", clean_output.strip()))
-        is_mode_switch = any(x in clean_output.lower() for x in ["switch to plan", "switch to act", "plan mode", "act mode"])
-        is_mostly_empty_ui = (clean_output.strip() in ["╭", "╰", "│", "┃", "╮", "╯"] or is_box_line) and len(
-            clean_output.strip()
-        ) <= 3
+        stripped = clean_output.strip()
+        if not stripped:
+            # Bare line breaks and redraw padding can't be UI frames or prompts
+            self._enqueue_output(clean_output)
+            return
 
-        if not is_welcome_screen and not is_mode_switch and is_mostly_empty_ui:
-            debug_log(DEBUG_DEBUG, f"Filtered UI message: {repr(clean_output)}", reason="mostly_empty_ui")
+        # Lone frame fragments (at most three box/space characters) are pure redraw noise
+        if len(stripped) <= 3 and all(c in _BOX_CHARSET or c.isspace() for c in stripped):
+            if _LEVEL_ENABLED[DEBUG_DEBUG]:
+                debug_log(DEBUG_DEBUG, f"Filtered UI message: {repr(clean_output)}", reason="mostly_empty_ui")
             return
 
-        # Detect interactive prompts
-        prompt_patterns = [
-            r"\[y/N\]\s*$",
-            r"\[Y/n\]\s*$",
-            r"\(y/n\)\s*$",
-            r"\(Y/N\)\s*$",
-            r"Continue\?\s*$",
-            r"Proceed\?\s*$",
-            r"Are you sure\?\s*$",
-            r"Enter .*:\s*$",
-            r"Password:\s*$",
-            r"Press.*Enter.*to.*continue\s*$",
-            r"Press.*any.*key\s*$",
-            r"\[.*\]\s*$",
-            r"Press .*to exit\s*$",
-            r"Press .* to return\s*$",
-        ]
-
-        for pattern in prompt_patterns:
-            if re.search(pattern, clean_output, re.IGNORECASE):
-                with self.state_lock:
-                    self.waiting_for_input = True
-                    self.input_prompt = clean_output.strip()
-                    self.last_prompt_time = time.time()
-                debug_log(DEBUG_INFO, "Interactive prompt detected", pattern=pattern)
-                break
-
-        if not self.waiting_for_input and re.search(r"[\[\(].*[\]\)]\s*$", clean_output.strip()):
-            with self.state_lock:
+        # Detect interactive prompts. Every pattern is end-anchored and cannot span a newline,
+        # so only the last non-blank line can match; scanning just that skips the rest of the chunk
+        last_line = stripped.rpartition("\n")[2]
+        match = _INPUT_REQUEST_RE.search(last_line)
+        if match and match.lastindex > len(PROMPT_PATTERNS):
+            # Leftmost hit was the generic bracketed suffix; a known prompt may still match further right
+            match = _PROMPT_RE.search(last_line)
+            if not match and not self.waiting_for_input:
+                self.input_prompt = stripped
                 self.waiting_for_input = True
-                self.input_prompt = clean_output.strip()
 
+        # No state_lock here: each attribute store is atomic, and setting the flag last means
+        # readers that see waiting_for_input also see the prompt that triggered it
+        if match:
+            self.input_prompt = stripped
+            self.last_prompt_time = time.time()
+            self.waiting_for_input = True
+            debug_log(DEBUG_INFO, "Interactive prompt detected", pattern=PROMPT_PATTERNS[match.lastindex - 1])
+
+        self._enqueue_output(clean_output)
+
+    def _enqueue_output(self, clean_output):
+        """Append cleaned output to the bounded output queue"""
         with self.output_queue_lock:
-            self.output_queue.append(clean_output)
-            if len(self.output_queue) > 100:
-                self.output_queue.popleft()
-                debug_log(DEBUG_WARN, "Queue overflow, removing oldest entry")
+            # Large PTY reads are split so every queued chunk fits in a single Telegram message
+            for chunk in split_message(clean_output, MAX_MESSAGE_LENGTH):
+                if len(self.output_queue) == OUTPUT_QUEUE_MAXLEN:
+                    debug_log(DEBUG_WARN, "Queue overflow, removing oldest entry")
+                # A full deque drops its oldest entry on append
+                self.output_queue.append(chunk)
+        if self.output_ready is not None:
+            self.output_ready.set()
 
     def send_command(self, command):
         """Send command to Cline"""
         debug_log(DEBUG_INFO, "send_command called", command=command)
 
-        with self.command_lock:
-            if not self.is_running:
-                debug_log(DEBUG_ERROR, "Cannot send command - PTY not running")
-                return "Error: PTY session not running"
+        if not self.is_running:
+            debug_log(DEBUG_ERROR, "Cannot send command - PTY not running")
+            return "Error: PTY session not running"
 
-            current_time = time.time()
-            with self.state_lock:
-                if self.waiting_for_input and (current_time - self.last_prompt_time) > 30:
-                    debug_log(DEBUG_INFO, "Resetting stale waiting_for_input state")
-                    self.waiting_for_input = False
-                    self.input_prompt = ""
+        with self.state_lock:
+            if self.waiting_for_input and (time.time() - self.last_prompt_time) > 30:
+                debug_log(DEBUG_INFO, "Resetting stale waiting_for_input state")
+            self.waiting_for_input = False
+            self.input_prompt = ""
 
-                try:
-                    self.waiting_for_input = False
-                    self.input_prompt = ""
+        # Only the write is serialized, so a command and a Ctrl+C can't interleave on the PTY
+        with self.command_lock:
+            try:
+                os.writev(self.master_fd, (command.encode(), b"\r\n"))
+                self.current_command = command
+            except Exception as e:
+                debug_log(
+                    DEBUG_ERROR,
+                    "Failed to send command",
+                    command=command,
+                    error=str(e),
+                )
+                return f"Error sending command: {e}"
 
-                    os.write(self.master_fd, f"{command}\r\n".encode())
-                    time.sleep(0.2)
-                    self.current_command = command
+        debug_log(DEBUG_INFO, "Command sent successfully", command=command)
+        return "Command sent"
 
-                    debug_log(DEBUG_INFO, "Command sent successfully", command=command)
-                    return "Command sent"
-                except Exception as e:
-                    debug_log(
-                        DEBUG_ERROR,
-                        "Failed to send command",
-                        command=command,
-                        error=str(e),
-                    )
-                    return f"Error sending command: {e}"
+    async def _await_output(self, timeout):
+        """Wait until Cline queues output after a command, or until timeout seconds pass"""
+        if self.output_ready is None:
+            await asyncio.sleep(timeout)
+            return
+        if not self.output_queue:
+            self.output_ready.clear()
+            try:
+                await asyncio.wait_for(self.output_ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return
+        await _coalesce_output(self)
 
-    def get_pending_output(self, max_length=4000):
+    async def _send_and_await_output(self, command, timeout):
+        """Send a command to Cline and wait up to timeout seconds for its output"""
+        self.send_command(command)
+        await self._await_output(timeout)
+
+    def get_pending_output(self, max_length=MAX_MESSAGE_LENGTH):
         """Get accumulated output"""
         with self.output_queue_lock:
             if not self.output_queue:
                 return None
 
-            combined = ""
-            chunks_used = 0
+            parts = []
+            total = 0
 
-            while self.output_queue and len(combined) < max_length:
+            while self.output_queue and total < max_length:
                 chunk = self.output_queue.popleft()
-                if len(combined + chunk) > max_length:
+                if total + len(chunk) > max_length:
+                    # Just popped under the same lock, so putting it back can't evict anything
                     self.output_queue.appendleft(chunk)
                     break
-                combined += chunk
-                chunks_used += 1
+                parts.append(chunk)
+                total += len(chunk)
 
-            result = combined.strip() if combined else None
+            chunks_used = len(parts)
+            result = "".join(parts).strip() if parts else None
             debug_log(
                 DEBUG_DEBUG,
                 "Output prepared",
@@ -462,17 +616,9 @@ class ClineTelegramBot:
         """Generic command handler"""
         debug_log(DEBUG_INFO, f"Processing {cmd} command")
 
-        handlers = {
-            "/start": self._start,
-            "/stop": self._stop,
-            "/status": self._status,
-            "/cancel": self._cancel,
-            "/plan": self._mode_switch,
-            "/act": self._mode_switch,
-        }
-
-        if cmd in handlers:
-            await handlers[cmd](update, context, cmd)
+        handler = self.command_handlers.get(cmd)
+        if handler:
+            await handler(update, context, cmd)
 
     async def _start(self, update: Update, context: ContextTypes.DEFAULT_TYPE, cmd: str):
         """Handle /start"""
@@ -483,7 +629,7 @@ class ClineTelegramBot:
 
         chat_id = update.effective_chat.id  # Capture immediately
 
-        if self.start_pty_session(self.application):
+        if await self.start_pty_session(self.application):
             await update.message.reply_text(
                 "✅ Cline session started\n\n**Bot Commands:**\n"
                 "• Natural language: `show me the current directory`\n"
@@ -507,16 +653,14 @@ class ClineTelegramBot:
 
     async def _stop(self, update: Update, context: ContextTypes.DEFAULT_TYPE, cmd: str):
         """Handle /stop"""
-        self.stop_pty_session(self.application)
+        await self.stop_pty_session(self.application)
         await update.message.reply_text("🛑 Cline session stopped")
 
     async def _status(self, update: Update, context: ContextTypes.DEFAULT_TYPE, cmd: str):
         """Handle /status"""
         with self.state_lock:
-            status = "🟢 Running" if self.session_active else "🔴 Stopped"
-            waiting = " (waiting for input)" if self.waiting_for_input else ""
-            reader_status = "✓" if self.output_reader_healthy else "✗"
-        await update.message.reply_text(f"Status: {status}{waiting}\nReader: {reader_status}")
+            key = (bool(self.session_active), bool(self.waiting_for_input), bool(self.output_reader_healthy))
+        await update.message.reply_text(STATUS_MESSAGES[key])
 
     async def _cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE, cmd: str):
         """Handle /cancel - Send Ctrl+C to cancel current task"""
@@ -539,10 +683,11 @@ class ClineTelegramBot:
         """Handle /plan and /act"""
         if not await self._ensure_session_active(update):
             return
-        mode = cmd[1:].upper()
-        await self._send_message(update.effective_chat.id, f"📋 Switched to **{mode} MODE**")
-        self.send_command(cmd)
-        await asyncio.sleep(0.5)
+        # Post the notice while Cline switches; its output is only forwarded once both are done
+        await asyncio.gather(
+            self._send_message(update.effective_chat.id, MODE_SWITCH_MESSAGES[cmd]),
+            self._send_and_await_output(cmd, 0.5),
+        )
         output = self.get_pending_output()
         if output:
             await self._send_message(update.effective_chat.id, output)
@@ -567,8 +712,7 @@ class ClineTelegramBot:
 
         if waiting:
             debug_log(DEBUG_INFO, "Processing interactive input")
-            self.send_command(message_text)
-            await asyncio.sleep(0.5)
+            await self._send_and_await_output(message_text, 0.5)
             output = self.get_pending_output()
             if output:
                 await self._send_message(update.effective_chat.id, output)
@@ -580,9 +724,10 @@ class ClineTelegramBot:
 
         if active:
             debug_log(DEBUG_INFO, "Processing regular command", command=message_text)
-            self.send_command(message_text)
-            await self._send_message(update.effective_chat.id, f"📤 Message sent: {message_text}")
-            await asyncio.sleep(2.0)
+            await asyncio.gather(
+                self._send_and_await_output(message_text, 2.0),
+                self._send_message(update.effective_chat.id, f"📤 Message sent: {message_text}"),
+            )
             output = self.get_pending_output()
             if output:
                 await self._send_message(update.effective_chat.id, output)
@@ -595,6 +740,7 @@ async def output_monitor(bot_instance, application, chat_id):
     debug_log(DEBUG_INFO, "Output monitor started")
     iteration_count = 0
     recent_messages = deque(maxlen=10)
+    recent_set = set()  # Mirrors recent_messages for O(1) membership checks
 
     while True:
         iteration_count += 1
@@ -609,48 +755,59 @@ async def output_monitor(bot_instance, application, chat_id):
             active = bot_instance.session_active
 
         if active and bot_instance.output_queue:
+            await _coalesce_output(bot_instance)
             output = bot_instance.get_pending_output()
             if output:
-                clean_output = strip_ansi_codes(output)
-                lines = [line.strip() for line in clean_output.split("\n")]
-                lines = list(dict.fromkeys(lines))
-                clean_output = "\n".join(lines)
-
-                ui_indicators = ["╭", "╰", "│", "┃", "/plan or /act"]
-                ui_score = sum(1 for indicator in ui_indicators if indicator in clean_output)
-
-                normalized = " ".join(clean_output.split())
-                msg_hash = hash(normalized)
+                # _process_output already removed ANSI codes before queueing
+                clean_output = output
+                # Strip and dedup lines in one pass; join reads the dict's keys in insertion order.
+                # get_pending_output already stripped the text, so single-line output needs neither.
+                if "\n" in clean_output:
+                    clean_output = "\n".join(dict.fromkeys(line.strip() for line in clean_output.split("\n")))
+
+                has_mode_hint = MODE_HINT in clean_output
+                # One pass over the text: how many distinct frame characters appear, plus the footer hint
+                ui_score = len(UI_INDICATOR_CHARS.intersection(clean_output)) + has_mode_hint
+
+                # Hash whitespace-normalized text so a redrawn frame with different spacing still dedups
+                words = clean_output.split()
+                msg_hash = hashlib.blake2b(" ".join(words).encode("utf-8", "replace"), digest_size=8).digest()
                 is_cline_response = "###" in clean_output
-                is_repetitive_ui = ui_score >= 1 and "/plan or /act" in clean_output
-                # Only filter repetitive UI if the message is mostly UI elements (high UI ratio)
-                ui_ratio = ui_score / max(1, len(clean_output.split()))
-                is_mostly_ui = ui_ratio > 0.3 or (ui_score >= 2 and len(clean_output.strip()) <= 100)
-
-                should_filter = (
-                    msg_hash in recent_messages
-                    or (is_repetitive_ui and not is_cline_response and is_mostly_ui)
-                    or (ui_score >= 3 and len(clean_output.strip()) <= 50)
-                )
+                is_repetitive_ui = has_mode_hint
+                # Text is already stripped (outer edges and each line), so its length needs no re-strip
+                output_length = len(clean_output)
+                # Only filter repetitive UI if the message is mostly UI elements (high UI ratio).
+                is_repetitive_mostly_ui = False
+                if is_repetitive_ui and not is_cline_response:
+                    ui_ratio = ui_score / max(1, len(words))
+                    is_repetitive_mostly_ui = ui_ratio > 0.3 or (ui_score >= 2 and output_length <= 100)
+                is_high_ui_score = ui_score >= 3 and output_length <= 50
+
+                should_filter = msg_hash in recent_set or is_repetitive_mostly_ui or is_high_ui_score
 
                 if should_filter:
-                    reason = "unknown"
-                    if msg_hash in recent_messages:
-                        reason = "duplicate_message"
-                    elif is_repetitive_ui and not is_cline_response and is_mostly_ui:
-                        reason = "repetitive_ui_mostly_ui"
-                    elif ui_score >= 3 and len(clean_output.strip()) <= 50:
-                        reason = "high_ui_score"
-
-                    debug_log(
-                        DEBUG_DEBUG,
-                        f"Filtered output message: {clean_output!r}",
-                        reason=reason,
-                        ui_score=ui_score,
-                    )
-                    if is_repetitive_ui:
+                    # Guarded here because the repr of a full message is built before debug_log runs
+                    if _LEVEL_ENABLED[DEBUG_DEBUG]:
+                        reason = "unknown"
+                        if msg_hash in recent_set:
+                            reason = "duplicate_message"
+                        elif is_repetitive_mostly_ui:
+                            reason = "repetitive_ui_mostly_ui"
+                        elif is_high_ui_score:
+                            reason = "high_ui_score"
+
+                        debug_log(
+                            DEBUG_DEBUG,
+                            f"Filtered output message: {clean_output!r}",
+                            reason=reason,
+                            ui_score=ui_score,
+                        )
+                    if is_repetitive_ui and msg_hash not in recent_set:
+                        if len(recent_messages) == recent_messages.maxlen:
+                            recent_set.discard(recent_messages[0])
                         recent_messages.append(msg_hash)
-                    await asyncio.sleep(2)
+                        recent_set.add(msg_hash)
+                    await _wait_for_output(bot_instance, active)
                     continue
 
                 debug_log(
@@ -664,7 +821,36 @@ async def output_monitor(bot_instance, application, chat_id):
                 except Exception as e:
                     debug_log(DEBUG_ERROR, "Error sending output", error=str(e))
 
+        await _wait_for_output(bot_instance, active)
+
+
+async def _coalesce_output(bot_instance):
+    """Give a burst of PTY output a short window to gather so it goes out as one message"""
+    output_ready = bot_instance.output_ready
+    if output_ready is None:
+        return
+    deadline = time.monotonic() + OUTPUT_COALESCE_WINDOW
+    while sum(map(len, bot_instance.output_queue)) < OUTPUT_COALESCE_CHARS:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        output_ready.clear()
+        try:
+            await asyncio.wait_for(output_ready.wait(), remaining)
+        except asyncio.TimeoutError:
+            break
+
+
+async def _wait_for_output(bot_instance, active):
+    """Block until the PTY reader queues new output, unless output is already pending"""
+    output_ready = bot_instance.output_ready
+    if output_ready is None:
+        # Reader never started, so nothing will signal; fall back to polling
         await asyncio.sleep(2)
+        return
+    output_ready.clear()
+    if not (active and bot_instance.output_queue):
+        await output_ready.wait()
 
 
 async def send_startup_message(app):
@@ -693,12 +879,8 @@ def main():
     application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
     bot.application = application
 
-    application.add_handler(CommandHandler("start", bot.handle_message))
-    application.add_handler(CommandHandler("stop", bot.handle_message))
-    application.add_handler(CommandHandler("status", bot.handle_message))
-    application.add_handler(CommandHandler("plan", bot.handle_message))
-    application.add_handler(CommandHandler("act", bot.handle_message))
-    application.add_handler(CommandHandler("cancel", bot.handle_message))
+    # One handler for every bot command: PTB checks a single frozenset instead of six handlers in turn
+    application.add_handler(CommandHandler([cmd.lstrip("/") for cmd in bot.command_handlers], bot.handle_message))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, bot.handle_message))
 
     async def post_init(app):
@@ -709,9 +891,10 @@ def main():
 
     def signal_handler(signum, frame):
         debug_log(DEBUG_INFO, f"Received signal {signum}, shutting down")
+        # Can't await from a signal handler; tear the session down synchronously
         with bot.state_lock:
             if bot.session_active:
-                bot.stop_pty_session()
+                bot._cleanup_resources()
         import sys
 
         sys.exit(0)
@@ -720,7 +903,8 @@ def main():
     signal.signal(signal.SIGTERM, signal_handler)
 
     debug_log(DEBUG_INFO, "Bot starting")
-    application.run_polling()
+    # handle_message only reads update.message, so don't have Telegram send edits, channel posts or callbacks
+    application.run_polling(allowed_updates=[Update.MESSAGE])
 
 
 if __name__ == "__main__":
@@ -7,6 +7,30 @@ import os
 import subprocess
 import sys
 
+BOT_SCRIPT = "cline_telegram_bot.py"
+
+
+def find_bot_pids():
+    """Find PIDs of running bot processes by reading /proc/<pid>/cmdline directly"""
+    if not os.path.isdir("/proc"):
+        # PIDs are ASCII digits; int() parses the bytes directly, so skip text decoding
+        result = subprocess.run(["pgrep", "-f", BOT_SCRIPT], capture_output=True)
+        return [int(pid) for pid in result.stdout.split()]
+
+    own_pid = os.getpid()
+    pids = []
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit() or int(entry.name) == own_pid:
+            continue
+        try:
+            with open(f"{entry.path}/cmdline", "rb") as f:
+                cmdline = f.read()
+        except OSError:
+            continue
+        if BOT_SCRIPT.encode() in cmdline:
+            pids.append(int(entry.name))
+    return pids
+
 
 def test_bot_commands():
     """Test basic bot functionality"""
@@ -15,9 +39,9 @@ def test_bot_commands():
     # Check if bot is running
     print("\n1. Checking if bot process is running...")
     try:
-        result = subprocess.run(["pgrep", "-f", "cline_telegram_bot.py"], capture_output=True, text=True)
-        if result.stdout.strip():
-            print(f"✅ Bot is running (PID: {result.stdout.strip()})")
+        pids = find_bot_pids()
+        if pids:
+            print(f"✅ Bot is running (PID: {' '.join(map(str, pids))})")
         else:
             print("❌ Bot is not running")
             return False
@@ -29,14 +53,17 @@ def test_bot_commands():
     print("\n2. Checking bot log...")
     try:
         if os.path.exists("bot.log"):
-            with open("bot.log", "r") as f:
-                log_content = f.read()
-                if log_content:
-                    print(f"✅ Bot log exists with content ({len(log_content)} bytes)")
-                    print("Last 200 chars of log:")
-                    print(log_content[-200:])
-                else:
-                    print("⚠️ Bot log is empty")
+            # Only read the tail; a long-running bot's log can be many megabytes
+            log_size = os.path.getsize("bot.log")
+            if log_size:
+                with open("bot.log", "rb") as f:
+                    f.seek(max(0, log_size - 200))
+                    tail = f.read()
+                print(f"✅ Bot log exists with content ({log_size} bytes)")
+                print("Last 200 bytes of log:")
+                print(tail.decode("utf-8", errors="replace"))
+            else:
+                print("⚠️ Bot log is empty")
         else:
             print("❌ Bot log file not found")
     except Exception as e:
@@ -3,88 +3,100 @@ Additional unit tests for ClineTelegramBot
 Covers areas not tested in the main test suite
 """
 
-import asyncio  # noqa: F401
-import os  # noqa: F401
+import asyncio
+import os
+import subprocess
 import threading
 import time
 from unittest.mock import AsyncMock, MagicMock, patch
 
+import psutil
 import pytest
 
-from cline_telegram_bot import ClineTelegramBot, strip_ansi_codes
+from cline_telegram_bot import (
+    ClineTelegramBot,
+    debug_log,
+    output_monitor,
+    strip_ansi_codes,
+)
 
 
 class TestPromptDetection:
     """Test various prompt detection patterns"""
 
-    def test_detects_parenthesis_prompts(self):
-        """Test detection of (y/n) style prompts at end of line"""
-        test_cases = [
+    @pytest.mark.parametrize(
+        "input_text,should_detect",
+        [
             ("Continue? (y/n)", True),
             ("Continue? (Y/N)", True),
             ("(y/n)", True),
             ("Choose (y/n) wisely", False),  # Not at end
-        ]
-
-        for input_text, should_detect in test_cases:
-            bot = ClineTelegramBot()
-            bot._process_output(input_text)
-            assert bot.waiting_for_input == should_detect, f"Failed for: {input_text}"
+        ],
+    )
+    def test_detects_parenthesis_prompts(self, input_text, should_detect):
+        """Test detection of (y/n) style prompts at end of line"""
+        bot = ClineTelegramBot()
+        bot._process_output(input_text)
+        assert bot.waiting_for_input == should_detect, f"Failed for: {input_text}"
 
-    def test_detects_question_prompts(self):
-        """Test detection of question-style prompts"""
-        test_cases = [
+    @pytest.mark.parametrize(
+        "input_text,should_detect",
+        [
             ("Continue?", True),
             ("Proceed?", True),
             ("Are you sure?", True),
             ("Continue? And more text", False),  # Not at end
-        ]
-
-        for input_text, should_detect in test_cases:
-            bot = ClineTelegramBot()
-            bot._process_output(input_text)
-            assert bot.waiting_for_input == should_detect, f"Failed for: {input_text}"
+        ],
+    )
+    def test_detects_question_prompts(self, input_text, should_detect):
+        """Test detection of question-style prompts"""
+        bot = ClineTelegramBot()
+        bot._process_output(input_text)
+        assert bot.waiting_for_input == should_detect, f"Failed for: {input_text}"
 
-    def test_detects_input_prompts(self):
-        """Test detection of input-style prompts"""
-        test_cases = [
+    @pytest.mark.parametrize(
+        "input_text,should_detect",
+        [
             ("Password: ", True),
             ("Enter your name: ", True),
             ("Enter something: ", True),
             ("Password: in the text", False),  # Not at end
-        ]
-
-        for input_text, should_detect in test_cases:
-            bot = ClineTelegramBot()
-            bot._process_output(input_text)
-            assert bot.waiting_for_input == should_detect, f"Failed for: {input_text}"
+        ],
+    )
+    def test_detects_input_prompts(self, input_text, should_detect):
+        """Test detection of input-style prompts"""
+        bot = ClineTelegramBot()
+        bot._process_output(input_text)
+        assert bot.waiting_for_input == should_detect, f"Failed for: {input_text}"
 
-    def test_detects_action_prompts(self):
-        """Test detection of action-style prompts"""
-        test_cases = [
+    @pytest.mark.parametrize(
+        "input_text,should_detect",
+        [
             ("Press Enter to continue", True),
             ("Press any key", True),
             ("Press Enter to continue and more", False),  # Not at end
-        ]
-
-        for input_text, should_detect in test_cases:
-            bot = ClineTelegramBot()
-            bot._process_output(input_text)
-            assert bot.waiting_for_input == should_detect, f"Failed for: {input_text}"
+        ],
+    )
+    def test_detects_action_prompts(self, input_text, should_detect):
+        """Test detection of action-style prompts"""
+        bot = ClineTelegramBot()
+        bot._process_output(input_text)
+        assert bot.waiting_for_input == should_detect, f"Failed for: {input_text}"
 
-    def test_detects_yes_no_bracket_prompts(self):
-        """UPDATED: Prompts must be at end of line"""
-        test_cases = [
+    @pytest.mark.parametrize(
+        "input_text,should_detect",
+        [
             ("Continue? [y/N]", True),  # ✅ Detects - at end
             ("Continue? [y/N] ", True),  # ✅ Detects - trailing space ok
             ("[y/N] options", False),  # ✅ NOT detected - not at end
             ("Choose [y/N] now", False),  # ✅ NOT detected - not at end
-        ]
-
-        for input_text, should_detect in test_cases:
-            bot = ClineTelegramBot()
-            bot._process_output(input_text)
-            assert bot.waiting_for_input == should_detect, f"Failed for: {input_text} (expected {should_detect})"
+        ],
+    )
+    def test_detects_yes_no_bracket_prompts(self, input_text, should_detect):
+        """UPDATED: Prompts must be at end of line"""
+        bot = ClineTelegramBot()
+        bot._process_output(input_text)
+        assert bot.waiting_for_input == should_detect, f"Failed for: {input_text} (expected {should_detect})"
 
     def test_detects_prompts_not_in_middle(self):
         """Test that prompts in middle of content don't trigger"""
@@ -107,6 +119,32 @@ class TestPromptDetection:
         # Should NOT detect because [y/N] is in middle of content, not at end
         assert bot.waiting_for_input is False
 
+    def test_only_last_line_of_chunk_is_a_prompt(self):
+        """Test that a multi-line chunk is checked for a prompt on its last non-blank line only"""
+        bot = ClineTelegramBot()
+        bot._process_output("Applied 3 edits\nContinue? [y/N]\n\n")
+        assert bot.waiting_for_input is True
+        assert bot.input_prompt == "Applied 3 edits\nContinue? [y/N]"
+
+        bot2 = ClineTelegramBot()
+        bot2._process_output("Continue? [y/N]\nApplying edits")
+        assert bot2.waiting_for_input is False
+
+    def test_bracketed_suffix_fallback(self):
+        """Test that a generic parenthesized suffix still marks input as pending"""
+        bot = ClineTelegramBot()
+        bot._process_output("Pick a profile (default)")
+        assert bot.waiting_for_input is True
+        assert bot.input_prompt == "Pick a profile (default)"
+        assert bot.last_prompt_time == 0  # Fallback does not start the stale-prompt clock
+
+    def test_known_prompt_wins_over_earlier_bracketed_text(self):
+        """Test that a known prompt is recognised even after earlier bracketed text"""
+        bot = ClineTelegramBot()
+        bot._process_output("Options (1) [y/N]")
+        assert bot.waiting_for_input is True
+        assert bot.last_prompt_time > 0
+
     def test_input_prompt_stored_correctly(self):
         """Test that the detected prompt is stored correctly"""
         bot = ClineTelegramBot()
@@ -144,6 +182,19 @@ class TestUIFiltering:
         bot2._process_output("│││")  # length 3
         assert len(bot2.output_queue) == 0  # Filtered
 
+    def test_filters_box_line_with_inner_whitespace(self):
+        """Test that short box lines with spaces between characters are filtered"""
+        bot = ClineTelegramBot()
+        bot._process_output("  │ │  ")
+        assert len(bot.output_queue) == 0
+
+    @pytest.mark.parametrize("fragment", ["│\x0c┃", "╰\xa0╯", "┃\x0b│"])
+    def test_filters_box_line_with_any_inner_whitespace(self, fragment):
+        """Test that any Unicode whitespace between frame characters is treated like a space"""
+        bot = ClineTelegramBot()
+        bot._process_output(fragment)
+        assert len(bot.output_queue) == 0
+
     def test_filters_multiple_box_chars(self):
         """Test filtering of multiple box characters"""
         bot = ClineTelegramBot()
@@ -203,6 +254,35 @@ class TestProcessOutputRobustness:
         assert len(bot.output_queue) > 0
         assert "世界" in bot.output_queue[0]
 
+    def test_skips_empty_and_keeps_whitespace_only_output(self):
+        """Test that empty chunks are dropped while bare line breaks are still queued"""
+        bot = ClineTelegramBot()
+
+        bot._process_output("")
+        bot._process_output("\x1b[0m")
+        assert len(bot.output_queue) == 0
+
+        bot._process_output("\r\n")
+        assert list(bot.output_queue) == ["\r\n"]
+        assert bot.waiting_for_input is False
+
+    def test_pty_reads_decode_split_multibyte_characters(self):
+        """Test that UTF-8 characters split across PTY reads are decoded intact"""
+        bot = ClineTelegramBot()
+        read_fd, write_fd = os.pipe()
+        encoded = "Hello 世界".encode("utf-8")
+        bot.master_fd = read_fd
+        try:
+            os.write(write_fd, encoded[:-1])
+            bot._on_pty_readable()
+            os.write(write_fd, encoded[-1:])
+            bot._on_pty_readable()
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
+
+        assert "".join(bot.output_queue) == "Hello 世界"
+
     def test_handles_mixed_line_endings(self):
         """Test processing of output with mixed line endings"""
         bot = ClineTelegramBot()
@@ -252,7 +332,7 @@ class TestStateTransitions:
         # Reset on command send
         bot.is_running = True
         bot.master_fd = 99
-        with patch("os.write", return_value=5):
+        with patch("os.writev", return_value=6):
             bot.send_command("test")
         assert bot.waiting_for_input is False
 
@@ -292,6 +372,33 @@ class TestStateTransitions:
         # Should have collected all values without corruption
         assert len(final_values) == 50
 
+    async def test_stop_during_start_waits_and_stops(self):
+        """Test that a stop issued while start is settling runs after it instead of being dropped"""
+        bot = ClineTelegramBot()
+
+        with patch("cline_telegram_bot.CLINE_COMMAND", ["sleep", "30"]):
+            with patch("cline_telegram_bot.ClineTelegramBot._ensure_session_clean"):
+                start = asyncio.create_task(bot.start_pty_session())
+                await asyncio.sleep(0.8)  # Inside the post-start settle
+                process = bot.process
+                await bot.stop_pty_session()
+
+        assert await start is True
+        assert bot.session_active is False
+        assert process.poll() is not None
+
+    async def test_stop_clears_is_running_before_teardown(self):
+        """Test that writes are refused before the worker thread closes the PTY"""
+        bot = ClineTelegramBot()
+        bot.session_active = True
+        bot.is_running = True
+        seen = []
+
+        with patch.object(ClineTelegramBot, "_cleanup_resources", side_effect=lambda: seen.append(bot.is_running)):
+            await bot.stop_pty_session()
+
+        assert seen == [False]
+
 
 class TestErrorRecovery:
     """Test error recovery mechanisms"""
@@ -304,7 +411,7 @@ class TestErrorRecovery:
         bot.waiting_for_input = True
         bot.last_prompt_time = time.time() - 35  # 35 seconds ago
 
-        with patch("os.write", return_value=5):
+        with patch("os.writev", return_value=6):
             bot.send_command("test")
 
         # Should reset stale state
@@ -316,8 +423,9 @@ class TestErrorRecovery:
         bot = ClineTelegramBot()
 
         # Fill queue past limit
-        for i in range(150):
-            bot._process_output(f"Message {i}")
+        messages = [f"Message {i}" for i in range(150)]
+        for message in messages:
+            bot._process_output(message)
 
         # Queue should be capped at 100
         assert len(bot.output_queue) <= 100
@@ -337,6 +445,74 @@ class TestErrorRecovery:
         # Should return error, not crash
         assert "Error" in result
 
+    def test_send_command_writes_crlf_terminated_line(self):
+        """Test that commands reach the PTY as a single CRLF-terminated line"""
+        bot = ClineTelegramBot()
+        read_fd, write_fd = os.pipe()
+        bot.master_fd = write_fd
+        bot.is_running = True
+        try:
+            result = bot.send_command("git status")
+            assert result == "Command sent"
+            assert os.read(read_fd, 100) == b"git status\r\n"
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
+
+
+class TestProcessDiscovery:
+    """Test discovery of stray Cline processes"""
+
+    def test_find_cline_processes_matches_cmdline(self):
+        """Test that processes with cline in their command line are found"""
+        bot = ClineTelegramBot()
+        # "cline" sits in argv itself; a shell comment is dropped when bash execs the command directly
+        proc = subprocess.Popen(["cline-probe", "5"], executable="sleep")
+        try:
+            time.sleep(0.1)
+            pids = bot._find_cline_processes()
+            assert proc.pid in pids
+            assert os.getpid() not in pids  # python processes are excluded
+        finally:
+            proc.kill()
+            proc.wait()
+
+    def test_kill_process_tree_returns_once_processes_exit(self):
+        """Test that killing a tree waits only as long as the processes take to exit"""
+        bot = ClineTelegramBot()
+        proc = subprocess.Popen(["sleep", "30"])
+        try:
+            start = time.monotonic()
+            bot._kill_process_tree(proc.pid)
+            assert time.monotonic() - start < 0.5
+            assert proc.poll() is not None
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+
+    def test_kill_process_trees_continues_past_access_denied(self):
+        """Test that one protected process does not stop the other trees being killed"""
+        bot = ClineTelegramBot()
+        procs = [subprocess.Popen(["sleep", "30"]) for _ in range(2)]
+        protected, other = procs
+        real_terminate = psutil.Process.terminate
+
+        def terminate(proc):
+            if proc.pid == protected.pid:
+                raise psutil.AccessDenied(proc.pid)
+            real_terminate(proc)
+
+        try:
+            with patch.object(psutil.Process, "terminate", terminate):
+                bot._kill_process_trees([protected.pid, other.pid])
+            assert other.poll() is not None
+        finally:
+            for proc in procs:
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+
 
 class TestOutputRetrievalEdgeCases:
     """Test edge cases in output retrieval"""
@@ -381,10 +557,27 @@ class TestOutputRetrievalEdgeCases:
         assert result is None
         assert len(bot.output_queue) == 1
 
+    def test_oversized_output_is_split_into_sendable_chunks(self):
+        """Test that a large PTY read is queued as chunks that each fit in one message"""
+        bot = ClineTelegramBot()
+        output = "".join(f"line {i:05d}\n" for i in range(1000))  # 11000 characters
+
+        bot._process_output(output)
+
+        assert all(len(chunk) <= 4000 for chunk in bot.output_queue)
+        assert all(chunk.endswith("\n") for chunk in bot.output_queue)
+        assert "".join(bot.output_queue) == output
+        assert bot.get_pending_output() is not None
+
 
 class TestAnsiCodeEdgeCases:
     """Test ANSI code stripping edge cases"""
 
+    def test_returns_plain_text_unchanged(self):
+        """Test that text without escape sequences is returned as-is"""
+        plain = "No escapes here [0m"
+        assert strip_ansi_codes(plain) is plain
+
     def test_strips_256_color_codes(self):
         """Test stripping of 256-color ANSI codes"""
         colored = "\x1b[38;5;196mRed\x1b[0m"
@@ -397,6 +590,12 @@ class TestAnsiCodeEdgeCases:
         result = strip_ansi_codes(colored)
         assert result == "Red"
 
+    def test_strips_8bit_csi_codes(self):
+        """Test stripping of single-character CSI (U+009B) sequences"""
+        colored = "\x9b31mRed\x9b0m"
+        result = strip_ansi_codes(colored)
+        assert result == "Red"
+
     def test_strips_multiple_sequential_codes(self):
         """Test stripping of multiple sequential codes"""
         colored = "\x1b[1m\x1b[32m\x1b[4mBold Green Underline\x1b[0m"
@@ -412,6 +611,30 @@ class TestAnsiCodeEdgeCases:
         assert "Red" in result
 
 
+class TestDebugLog:
+    """Test debug log level gating"""
+
+    def test_disabled_level_prints_nothing(self, capsys):
+        """Test that messages at a disabled level are dropped before formatting"""
+        with patch.dict("cline_telegram_bot._LEVEL_ENABLED", {"DEBUG": False}):
+            debug_log("DEBUG", "hidden", detail="x")
+        assert capsys.readouterr().out == ""
+
+    def test_enabled_level_prints_context(self, capsys):
+        """Test that enabled messages include level, message and context"""
+        debug_log("INFO", "shown", pid=42)
+        out = capsys.readouterr().out
+        assert out.endswith("[INFO] shown | pid=42\n")
+
+    def test_filtered_fragment_skips_disabled_debug_log(self):
+        """Test that filtering a UI fragment formats nothing when DEBUG is off"""
+        bot = ClineTelegramBot()
+        with patch.dict("cline_telegram_bot._LEVEL_ENABLED", {"DEBUG": False}):
+            with patch("cline_telegram_bot.debug_log") as mock_log:
+                bot._process_output("│")
+        mock_log.assert_not_called()
+
+
 class TestConcurrencyStress:
     """Stress tests for concurrent operations"""
 
@@ -443,22 +666,24 @@ class TestConcurrencyStress:
         bot = ClineTelegramBot()
         read_count = [0]
         errors = []
+        # Release all threads together so reads and writes overlap without sleeping
+        start = threading.Barrier(3)
 
         def writer():
             try:
+                start.wait()
                 for i in range(100):
                     bot._process_output(f"msg_{i}")
-                    time.sleep(0.001)
             except Exception as e:
                 errors.append(e)
 
         def reader():
             try:
+                start.wait()
                 for _ in range(100):
                     output = bot.get_pending_output()
                     if output:
                         read_count[0] += 1
-                    time.sleep(0.001)
             except Exception as e:
                 errors.append(e)
 
@@ -503,6 +728,181 @@ class TestAsyncIntegration:
 
         bot.application.bot.send_message.assert_called_once()
 
+    async def test_mode_switch_sends_notice_command_and_output(self):
+        """Test that /plan posts its notice, writes the command and forwards Cline's reply"""
+        bot = ClineTelegramBot()
+        bot.session_active = True
+        bot.is_running = True
+        bot.output_ready = asyncio.Event()
+        bot.application = MagicMock()
+        bot.application.bot.send_message = AsyncMock()
+        update = MagicMock()
+        update.effective_chat.id = 123
+        read_fd, write_fd = os.pipe()
+        bot.master_fd = write_fd
+        asyncio.get_running_loop().call_later(0.05, bot._enqueue_output, "Plan mode")
+        try:
+            await bot._mode_switch(update, None, "/plan")
+            assert os.read(read_fd, 100) == b"/plan\r\n"
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
+
+        sent = [c.kwargs["text"] for c in bot.application.bot.send_message.call_args_list]
+        assert sent == ["📋 Switched to **PLAN MODE**", "Plan mode"]
+
+    async def test_await_output_returns_when_output_arrives(self):
+        """Test that handlers stop waiting as soon as Cline replies instead of sleeping the full timeout"""
+        bot = ClineTelegramBot()
+        bot.output_ready = asyncio.Event()
+        asyncio.get_running_loop().call_later(0.05, bot._enqueue_output, "On branch main")
+
+        start = time.monotonic()
+        await bot._await_output(2.0)
+
+        assert time.monotonic() - start < 1.0
+        assert bot.get_pending_output() == "On branch main"
+
+    async def test_event_loop_output_reader(self):
+        """Test that PTY output is read from the event loop when one is running"""
+        bot = ClineTelegramBot()
+        read_fd, write_fd = os.pipe()
+        bot.master_fd = read_fd
+        try:
+            bot._start_output_reader()
+            assert bot.output_reader_healthy is True
+
+            os.write(write_fd, b"Hello from the loop")
+            await asyncio.sleep(0.05)
+            assert list(bot.output_queue) == ["Hello from the loop"]
+
+            bot._stop_output_reader()
+            assert bot.output_reader_healthy is False
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
+
+    async def test_output_reader_stops_on_eof(self):
+        """Test that the event loop stops watching the PTY once it reports EOF"""
+        bot = ClineTelegramBot()
+        read_fd, write_fd = os.pipe()
+        bot.master_fd = read_fd
+        try:
+            bot._start_output_reader()
+            os.close(write_fd)
+            await asyncio.sleep(0.05)
+            assert bot.output_reader_healthy is False
+            assert bot.output_loop is None
+        finally:
+            os.close(read_fd)
+
+    async def test_output_monitor_wakes_on_new_output(self):
+        """Test that the output monitor forwards queued output without waiting for a poll interval"""
+        bot = ClineTelegramBot()
+        bot.session_active = True
+        bot.output_ready = asyncio.Event()
+        application = MagicMock()
+        application.bot.send_message = AsyncMock()
+
+        monitor = asyncio.create_task(output_monitor(bot, application, 123))
+        try:
+            await asyncio.sleep(0.05)
+            bot._enqueue_output("Build finished")
+            await asyncio.sleep(0.4)
+            application.bot.send_message.assert_called_once_with(chat_id=123, text="Build finished")
+        finally:
+            monitor.cancel()
+
+    async def test_output_monitor_coalesces_bursts(self):
+        """Test that output arriving within the coalescing window is sent as one message"""
+        bot = ClineTelegramBot()
+        bot.session_active = True
+        bot.output_ready = asyncio.Event()
+        application = MagicMock()
+        application.bot.send_message = AsyncMock()
+
+        monitor = asyncio.create_task(output_monitor(bot, application, 123))
+        try:
+            await asyncio.sleep(0.05)
+            bot._enqueue_output("Compiling...\n")
+            await asyncio.sleep(0.05)
+            bot._enqueue_output("Done")
+            await asyncio.sleep(0.4)
+            application.bot.send_message.assert_called_once_with(chat_id=123, text="Compiling...\nDone")
+        finally:
+            monitor.cancel()
+
+    async def test_output_monitor_drops_repeated_lines(self):
+        """Test that repeated lines are sent once, in first-seen order"""
+        bot = ClineTelegramBot()
+        bot.session_active = True
+        bot.output_ready = asyncio.Event()
+        application = MagicMock()
+        application.bot.send_message = AsyncMock()
+
+        monitor = asyncio.create_task(output_monitor(bot, application, 123))
+        try:
+            await asyncio.sleep(0.05)
+            bot._enqueue_output("  step 1\nstep 2\nstep 1  \nstep 3")
+            await asyncio.sleep(0.4)
+            application.bot.send_message.assert_called_once_with(chat_id=123, text="step 1\nstep 2\nstep 3")
+        finally:
+            monitor.cancel()
+
+    async def test_output_monitor_filters_mode_hint_frames(self):
+        """Test that redrawn mode-hint frames are dropped while Cline responses mentioning the hint are sent"""
+        bot = ClineTelegramBot()
+        bot.session_active = True
+        bot.output_ready = asyncio.Event()
+        application = MagicMock()
+        application.bot.send_message = AsyncMock()
+        response = "### Plan ready\nReview the steps, then switch with /plan or /act"
+
+        monitor = asyncio.create_task(output_monitor(bot, application, 123))
+        try:
+            await asyncio.sleep(0.05)
+            bot._enqueue_output("╭ /plan or /act ╰")
+            await asyncio.sleep(0.4)
+            bot._enqueue_output(response)
+            await asyncio.sleep(0.4)
+            application.bot.send_message.assert_called_once_with(chat_id=123, text=response)
+        finally:
+            monitor.cancel()
+
+    async def test_output_monitor_dedups_whitespace_variant_frames(self):
+        """Test that a redrawn frame differing only in spacing is dropped as a duplicate"""
+        bot = ClineTelegramBot()
+        bot.session_active = True
+        bot.output_ready = asyncio.Event()
+        application = MagicMock()
+        application.bot.send_message = AsyncMock()
+        gap = " " * 30
+        # Wide enough to pass the UI-ratio checks, so only the digest can catch it
+        variant = f"│{gap}/plan or /act{gap}│{gap}one two three four five"
+
+        monitor = asyncio.create_task(output_monitor(bot, application, 123))
+        try:
+            await asyncio.sleep(0.05)
+            bot._enqueue_output("│ /plan or /act │ one two three four five")
+            await asyncio.sleep(0.4)
+            bot._enqueue_output(variant)
+            await asyncio.sleep(0.4)
+            application.bot.send_message.assert_not_called()
+        finally:
+            monitor.cancel()
+
+    async def test_status_reply_text(self):
+        """Test that /status reports session, prompt and reader state"""
+        bot = ClineTelegramBot()
+        bot.session_active = True
+        bot.waiting_for_input = True
+        update = MagicMock()
+        update.message.reply_text = AsyncMock()
+
+        await bot._status(update, None, "/status")
+
+        update.message.reply_text.assert_called_once_with("Status: 🟢 Running (waiting for input)\nReader: ✗")
+
 
 class TestMemoryManagement:
     """Test memory usage and cleanup"""
@@ -512,8 +912,9 @@ class TestMemoryManagement:
         bot = ClineTelegramBot()
 
         # Add lots of output
-        for i in range(10000):
-            bot._process_output("x" * 100)
+        message = "x" * 100
+        for _ in range(10000):
+            bot._process_output(message)
 
         # Queue should still be at max 100 items
         with bot.output_queue_lock:
@@ -534,7 +935,7 @@ class TestMemoryManagement:
 
         assert len(bot.output_queue) == 0
 
-    def test_repeated_start_stop_no_leak(self):
+    async def test_repeated_start_stop_no_leak(self):
         """Test that repeated start/stop doesn't leak resources"""
         # This is more of an integration test
         bot = ClineTelegramBot()
@@ -545,7 +946,7 @@ class TestMemoryManagement:
 
             with patch("cline_telegram_bot.ClineTelegramBot._kill_process_tree"):
                 with patch("cline_telegram_bot.ClineTelegramBot._ensure_session_clean"):
-                    bot.stop_pty_session()
+                    await bot.stop_pty_session()
 
             assert len(bot.output_queue) == 0
             assert bot.session_active is False